@@ -12,9 +12,17 @@ Methods:
 
 '''
 
+import collections
+import hashlib
+import math
 import numpy as np
 import webbrowser
 
+# White and black [R, G, B], targets for the brighter (roof) and darker (side) versions
+# of a single cube color
+_SHADE_TARGETS = np.array([[255.0, 255.0, 255.0],
+                           [  0.0,   0.0,   0.0]])
+
 class ArrayDraw:
     """
     This class generate 2D or 3D visualizations for arrays:
@@ -53,12 +61,20 @@ class ArrayDraw:
 
     """
     
+    # make_svg() outputs shared by all instances, keyed by svg_cache_key(), least recent first
+    # At most _svg_cache_size SVGs and svg_cache_max_bytes (text and per-tile color keys) are kept
+    # Set ArrayDraw.svg_cache_max_bytes = 0 to disable the cache, see also clear_svg_cache()
+    svg_cache_max_bytes = 64 * 1024 * 1024
+    _svg_cache = collections.OrderedDict()
+    _svg_cache_size = 64
+    _svg_cache_bytes = 0
+    
     def __init__(self, shape, cube_size=30, cube_color='#FF0000',
                               line_size=None, line_color='#000000', 
                               legends=[None, None, None], legend_size=None, 
                               title=None, title_size=None, 
                               background_color = None, text_color='#000000',
-                              theta=45, projection=0.5):       
+                              theta=45, projection=0.5, precision=2):       
         """
         Constructor method. 
         
@@ -72,6 +88,9 @@ class ArrayDraw:
                           3 colors: For front, top and side
                           Three 2D arrays with the color for each square tile in
                           Face, Roof, Side  [[HxW], [WxD], [HxD]]                        
+                              Either #RRGGBB strings, or [R, G, B] values in an
+                              extra last dimension [[HxWx3], [WxDx3], [HxDx3]],
+                              with values from 0 to 255 (not 0 to 1)
             line_size:    Width for the line (Default = cube_size // 10)
             line_color:   1 color
             legends:      3-element list for Height, Width, Depth
@@ -83,19 +102,12 @@ class ArrayDraw:
             text_color:   Text color  
             theta :       Angle for depth axis in degrees [0 - 90] (Default = 45) 
             projection:   Scale for the depth units (Default = 0.5)                        
+            precision:    Number of decimals for the coordinates in the SVG (Default = 2)
         """
         
         # Validate shape
-        if len(shape) != 3:
-            print('Shape must be a list of 3 elements')
-            return
-        nz = 0
-        for element in shape:
-            if element <= 0:
-                nz = nz + 1
-        if nz > 1:
-            print('At least two dimensions must be >= 1')
-            return                
+        if len(shape) != 3 or sum(element <= 0 for element in shape) > 1:
+            raise ValueError('Shape must be a list of 3 elements, with at least two dimensions >= 1')
         self.shape = shape
         # Validate legends
         if legends is None:
@@ -108,7 +120,7 @@ class ArrayDraw:
         # Size of elements
         self.cube_size = cube_size
         if line_size is None:
-            line_size = self.cube_size // 10
+            line_size = int(self.cube_size // 10)
         self.line_size = line_size       
         if legend_size is None:
             legend_size = self.cube_size / 4
@@ -119,6 +131,7 @@ class ArrayDraw:
         
         # Colors
         self.cube_color = self.validate_color(cube_color)
+        self.update_colors()
         self.line_color = line_color
         self.background_color = background_color
         self.text_color = text_color
@@ -126,14 +139,34 @@ class ArrayDraw:
         # Projection parameters 
         self.theta = theta
         self.projection = projection
-        self.x_proj = self.projection * np.cos(np.radians(self.theta))
-        self.y_proj = self.projection * np.sin(np.radians(self.theta))
+        self.update_projection()
+        
+        # Output parameters
+        self.precision = precision
+           
+    def update_colors(self):
+        # Per-tile color arrays are flattened once (row-major) to plain lists for svg_array()
+        # Called again by make_svg() when drawing, so a changed cube_color is used
+        self.flat_colors = [self.flatten_color(color) for color in self.validate_color(self.cube_color)]
+    
+    def update_projection(self):
+        # Values derived from shape, cube_size, theta and projection, computed once per drawing 
+        # rather than per tile. Called again by make_svg(), so changed attributes are used
+        # Scalar trigonometry with math, NumPy dispatch is slower for single values
+        theta_rad = math.radians(self.theta)
+        self.x_proj = self.projection * math.cos(theta_rad)
+        self.y_proj = self.projection * math.sin(theta_rad)
+        # Projection of one cube depth, and of the whole depth along the x- and y-axes
+        self.dx = self.cube_size * self.x_proj
+        self.dy = self.cube_size * self.y_proj
+        self.depth_x_off = self.shape[2] * self.dx
+        self.depth_y_off = self.shape[2] * self.dy
+        # Minimum area to show the array
+        self.array_width, self.array_height = self.get_array_size()
            
     def get_array_size(self):       
-        width  = ((self.shape[1] * self.cube_size) +
-                  (self.shape[2] * self.cube_size * self.x_proj)) 
-        height = ((self.shape[0] * self.cube_size) +
-                  (self.shape[2] * self.cube_size * self.y_proj))
+        width  = (self.shape[1] * self.cube_size) + self.depth_x_off
+        height = (self.shape[0] * self.cube_size) + self.depth_y_off
         return width, height 
     
     def get_labels_margins(self):
@@ -151,17 +184,38 @@ class ArrayDraw:
        
     def save_svg(self, filename):        
         svg_list = self.make_svg()    
-        # Write SVG file to a file
-        f = open(filename,'w')
-        for svg_element in svg_list:
-            f.write(svg_element + '\n')
-        f.close()
+        # Write SVG file to a file, streaming one element at a time
+        # Elements are whole blocks (e.g. all the tiles of a face), each is encoded to UTF-8 
+        # (SVG default) and written in binary mode, so only one block is copied at a time
+        # A large buffer merges the newlines and small elements into few writes
+        with open(filename, 'wb', buffering=65536) as f:
+            f.writelines(self.svg_lines(svg_list))
         
         return 
     
+    def svg_lines(self, svg_list):
+        # Generator with the UTF-8 bytes of each SVG element, followed by a newline
+        for svg_element in svg_list:
+            yield svg_element.encode('utf-8')
+            yield b'\n'
+    
     def make_svg(self):              
-        # Minimum area to show the array
-        width, height = self.get_array_size()
+        # Projection values, in case shape, cube_size, theta or projection were changed
+        self.update_projection()
+        # Reuse a previous SVG (from any instance) drawn with the same parameters
+        # The key is built from the attributes themselves, not from values derived from them
+        key = self.svg_cache_key()
+        cache = ArrayDraw._svg_cache
+        if key in cache:
+            cache.move_to_end(key)
+            svg_list, self.cube_width, self.cube_height, _ = cache[key]
+            # Copy of the list of blocks, so the caller can modify it
+            self.svg_list = list(svg_list)
+            return self.svg_list
+        # Colors, in case cube_color was changed
+        self.update_colors()
+        # Minimum area to show the array, computed in update_projection()
+        width, height = self.array_width, self.array_height
         # Additional space of labels [Top, Right, Bottom, Left]
         label_margins = self.get_labels_margins()
         # Additional margins [Top, Right, Bottom, Left] (One 'cube_side')
@@ -175,77 +229,195 @@ class ArrayDraw:
         y_offset = 0 + label_margins[0] + space_margins[0] 
         
         # SVG start tag
-        viewbox_str = 'viewBox="0 0 ' + str(self.cube_width) + ' ' + str(self.cube_height) + '"'
+        # Size rounded up to self.precision decimals, so the drawing is never cropped
+        # (after removing float noise, so e.g. 150.0 is not rounded up to 150.01)
+        p = self.precision
+        viewbox_width  = math.ceil(round(self.cube_width  * 10**p, 6)) / 10**p
+        viewbox_height = math.ceil(round(self.cube_height * 10**p, 6)) / 10**p
+        viewbox_str = f'viewBox="0 0 {viewbox_width:.{p}f} {viewbox_height:.{p}f}"'
         self.svg_list = []
-        self.svg_list.append('<svg xmlns="http://www.w3.org/2000/svg" ' + viewbox_str + '>')
+        self.svg_list.append('<svg xmlns="http://www.w3.org/2000/svg" ' +
+                             f'xmlns:xlink="http://www.w3.org/1999/xlink" {viewbox_str}>')
         
         # Set background color
         if self.background_color is not None:               
-            self.svg_list.append('<rect width="100%" height="100%" fill="{0}"/>'.format(self.background_color))
+            self.svg_list.append(f'<rect width="100%" height="100%" fill="{self.background_color}"/>')
         
         # Draw cube
-        self.svg_list = self.svg_list + self.svg_array(x_offset, y_offset)
+        self.svg_array(x_offset, y_offset, self.svg_list)
         # Draw labels
-        self.svg_list = self.svg_list + self.svg_labels(x_offset, y_offset)
+        self.svg_labels(x_offset, y_offset, self.svg_list)
         
         # SVG end tag 
         self.svg_list.append('</svg>')
+        
+        if key is not None:
+            # Approximate memory of the entry: SVG text plus per-tile colors in the key,
+            # raw bytes or, for object arrays, the length of each value as text
+            n_bytes = sum(len(svg_element) for svg_element in self.svg_list)
+            for color in key[2]:
+                if type(color) is tuple:
+                    values = color[2]
+                    n_bytes += len(values) if type(values) is bytes else sum(len(str(value)) for value in values)
+            if n_bytes <= ArrayDraw.svg_cache_max_bytes:
+                cache[key] = (list(self.svg_list), self.cube_width, self.cube_height, n_bytes)
+                ArrayDraw._svg_cache_bytes += n_bytes
+            # Drop the least recently used SVGs
+            while cache and (len(cache) > ArrayDraw._svg_cache_size or 
+                             ArrayDraw._svg_cache_bytes > ArrayDraw.svg_cache_max_bytes):
+                ArrayDraw._svg_cache_bytes -= cache.popitem(last=False)[1][3]
      
         return self.svg_list
 
-    def svg_array(self, x_offset=0, y_offset=0):
-        svg_list = []
+    @staticmethod
+    def clear_svg_cache():
+        # Removes all the SVGs kept by make_svg()
+        ArrayDraw._svg_cache.clear()
+        ArrayDraw._svg_cache_bytes = 0
+
+    def svg_cache_key(self):
+        # Parameters used to draw the SVG, per-tile color arrays are included as 
+        # (dtype, shape, raw bytes). Raw bytes of object arrays are pointers, not strings,
+        # so these are included as (dtype, shape, values) instead.
+        # None if a parameter cannot be hashed, then the SVG is not cached
+        cube_color = self.cube_color
+        if type(cube_color) is str:
+            cube_color = [cube_color]
+        def array_key(color):
+            if color.dtype.kind == 'O':
+                return (color.dtype.str, color.shape, tuple(color.ravel().tolist()))
+            return (color.dtype.str, color.shape, color.tobytes())
+        colors = tuple(array_key(color) if isinstance(color, np.ndarray) else color
+                       for color in cube_color)
+        # Values are paired with their type, as equal values can print differently (30 and 30.0)
+        def typed(values):
+            return tuple((type(value), value) for value in values)
+        key = (typed(self.shape), typed([self.cube_size, self.line_size, self.legend_size, self.title_size,
+                                         self.theta, self.projection, self.precision]),
+               colors, self.line_color, typed(self.legends), self.title,
+               self.background_color, self.text_color)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def svg_array(self, x_offset=0, y_offset=0, svg_list=None):
+        # Tiles are appended to svg_list if given, otherwise to a new list
+        if svg_list is None:
+            svg_list = []
+        n_height, n_width, n_depth = self.shape
+        # Local copies of the parameters used for all tiles
+        size = self.cube_size
+        dx = self.dx
+        dy = self.dy
+        depth_y_off = self.depth_y_off
+        # Printf-style templates for the tiles, see svg_face_tile(), svg_roof_tile() and svg_side_tile()
+        # Size is the same for all tiles, so it is set once here, leaving only the coordinates 
+        # and the fill color to be formatted per tile. Line parameters are set in a group for all tiles
+        # Coordinates are rounded to self.precision decimals
+        coord = f'%.{self.precision}f'
+        face_template = f'<rect x="{coord}" y="{coord}" width="{size}" height="{size}" fill="%s"/>'
+        points_str = ' '.join([f'{coord}, {coord}'] * 4)
+        polygon_template = f'<polygon points="{points_str}" fill="%s"/>'
+        # Corners (x1, y1) ... (x4, y4) of roof and side tiles as offsets from the tile origin
+        roof_offsets = [0, 0, dx, -dy, dx + size, -dy, size, 0]
+        side_offsets = [0, 0, dx, -dy, dx, size - dy, 0, size]
+        # Tiles with a single color are drawn once in <defs> and placed with <use>
+        # Their ids start with a short hash of these tiles, so drawings inlined in one
+        # page (e.g. HTML) only share ids when their tiles are identical
+        def_tiles = [template % tuple(offsets + [color]) for template, offsets, color in 
+                     zip([face_template, polygon_template, polygon_template], 
+                         [[0, 0], roof_offsets, side_offsets], self.flat_colors) 
+                     if not isinstance(color, list)]
+        id_prefix = 'a' + hashlib.sha1(''.join(def_tiles).encode('utf-8')).hexdigest()[:6]
+        # Faces with a zero dimension (e.g. roof and side for a 2D plane) are skipped
+        defs = []
+        tiles = []
         # ========== Make face tiles ==========
-        face_x_origin = x_offset
-        face_y_origin = y_offset + (self.shape[2] * self.y_proj * self.cube_size)
-        for i_height in range(self.shape[0]):
-            for i_width in range(self.shape[1]):
-                if type(self.cube_color[0]) is np.ndarray:
-                    face_color = self.cube_color[0][i_height, i_width]    
-                else:
-                    face_color = self.cube_color[0] 
-                svg_list.append(self.svg_face_tile(face_x_origin + (i_width  * self.cube_size), 
-                                                   face_y_origin + (i_height * self.cube_size), 
-                                                   self.cube_size,
-                                                   face_color,                                                  
-                                                   self.line_color,
-                                                   self.line_size))
+        if n_height > 0 and n_width > 0:
+            face_x_origin = x_offset
+            face_y_origin = y_offset + depth_y_off
+            # Tile origins from the height and width steps, broadcast to [HxW]
+            i_height = np.arange(n_height)[:, np.newaxis]
+            i_width = np.arange(n_width)[np.newaxis, :]
+            face_x, face_y = np.broadcast_arrays(face_x_origin + (i_width * size),
+                                                 face_y_origin + (i_height * size))
+            face_x = face_x.ravel()
+            face_y = face_y.ravel()
+            self.format_face_tiles(f'{id_prefix}f', face_template, [0, 0], 
+                                   [face_x, face_y], self.flat_colors[0], defs, tiles)
         # ========== Make roof tiles ==========
-        roof_x_origin = x_offset
-        roof_y_origin = y_offset + (self.shape[2] * self.y_proj * self.cube_size) 
-        for i_width in range(self.shape[1]):
-            for i_depth in range(self.shape[2]):
-                if type(self.cube_color[1]) is np.ndarray:
-                    roof_color = self.cube_color[1][i_width, i_depth]    
-                else:
-                    roof_color = self.cube_color[1] 
-                svg_list.append(self.svg_roof_tile(roof_x_origin + (i_width  * self.cube_size) + (i_depth * self.cube_size * self.x_proj), 
-                                                   roof_y_origin - (i_depth * self.cube_size * self.y_proj), 
-                                                   self.cube_size,
-                                                   self.cube_size * self.x_proj,
-                                                   self.cube_size * self.y_proj,
-                                                   roof_color,                                                  
-                                                   self.line_color,
-                                                   self.line_size))                
-        # ========== Make side tiles ==========        
-        side_x_origin = x_offset + (self.cube_size * (self.shape[1] - 1))
-        side_y_origin = y_offset + (self.shape[2] * self.y_proj * self.cube_size)
-        for i_height in range(self.shape[0]):
-            for i_depth in range(self.shape[2]):
-                if type(self.cube_color[2]) is np.ndarray:
-                    side_color = self.cube_color[2][i_height, i_depth]    
-                else:
-                    side_color = self.cube_color[2]   
-                svg_list.append(self.svg_side_tile(side_x_origin + (i_depth * self.cube_size * self.x_proj), 
-                                                   side_y_origin + (i_height * self.cube_size) - (i_depth * self.cube_size * self.y_proj),
-                                                   self.cube_size,
-                                                   self.cube_size * self.x_proj,
-                                                   self.cube_size * self.y_proj,
-                                                   side_color,                                                  
-                                                   self.line_color,
-                                                   self.line_size))                                   
-        return svg_list
+        if n_width > 0 and n_depth > 0:
+            roof_x_origin = x_offset
+            roof_y_origin = y_offset + depth_y_off
+            # Tile origins from the width and depth steps, broadcast to [WxD]
+            i_width = np.arange(n_width)[:, np.newaxis]
+            i_depth = np.arange(n_depth)[np.newaxis, :]
+            roof_x, roof_y = np.broadcast_arrays(roof_x_origin + (i_width * size) + (i_depth * dx),
+                                                 roof_y_origin - (i_depth * dy))
+            roof_x = roof_x.ravel()
+            roof_y = roof_y.ravel()
+            roof_points = [roof_x + offset if i % 2 == 0 else roof_y + offset
+                           for i, offset in enumerate(roof_offsets)]
+            self.format_face_tiles(f'{id_prefix}r', polygon_template, roof_offsets,
+                                   roof_points, self.flat_colors[1], defs, tiles)
+        # ========== Make side tiles ==========
+        if n_height > 0 and n_depth > 0:
+            side_x_origin = x_offset + (size * (n_width - 1))
+            side_y_origin = y_offset + depth_y_off
+            # Tile origins from the height and depth steps, broadcast to [HxD]
+            i_height = np.arange(n_height)[:, np.newaxis]
+            i_depth = np.arange(n_depth)[np.newaxis, :]
+            side_x, side_y = np.broadcast_arrays(side_x_origin + size + (i_depth * dx),
+                                                 side_y_origin + (i_height * size) - (i_depth * dy))
+            side_x = side_x.ravel()
+            side_y = side_y.ravel()
+            side_points = [side_x + offset if i % 2 == 0 else side_y + offset
+                           for i, offset in enumerate(side_offsets)]
+            self.format_face_tiles(f'{id_prefix}s', polygon_template, side_offsets,
+                                   side_points, self.flat_colors[2], defs, tiles)
         
+        if defs:
+            svg_list.append(f'<defs>{"".join(defs)}</defs>')
+        svg_list.append(f'<g stroke="{self.line_color}" stroke-width="{self.line_size}" stroke-linejoin="round">')
+        svg_list.extend(tiles)
+        svg_list.append('</g>')
+        return svg_list
+
+    def format_tiles(self, template, columns, svg_list):
+        # Formats all the tiles of a face, roof or side with one printf-style call on the 
+        # template repeated once per tile (one line per tile), and appends the result to svg_list
+        # columns holds the values for each template field, one entry per tile
+        n_tiles = len(columns[0])
+        if n_tiles == 0:
+            return svg_list
+        # Interleave the columns as (tile 1 values, tile 2 values, ...)
+        values = np.empty((n_tiles, len(columns)), dtype=object)
+        for i_column, column in enumerate(columns):
+            values[:, i_column] = column
+        svg_list.append('\n'.join([template] * n_tiles) % tuple(values.ravel().tolist()))
+        return svg_list
+
+    def format_face_tiles(self, tile_id, template, offsets, points, color, defs, svg_list):
+        # Formats the tiles of a face, roof or side, points are the template coordinates
+        # for all the tiles, offsets are the same coordinates relative to the tile origin
+        # color is an entry of self.flat_colors:
+        #    List with one color per tile: each tile is drawn in full
+        #    Single color: the tile is drawn once at the origin in defs, then placed at the 
+        #                  origin of each tile with <use>
+        if isinstance(color, list):
+            return self.format_tiles(template, points + [color], svg_list)
+        if len(points[0]) == 0:
+            return svg_list
+        tile_str = template % tuple(offsets + [color])
+        # Add the id right after the tag name
+        defs.append(tile_str.replace(' ', f' id="{tile_id}" ', 1))
+        # xlink:href is read by SVG 1.1 and SVG 2 renderers
+        coord = f'%.{self.precision}f'
+        use_template = f'<use xlink:href="#{tile_id}" x="{coord}" y="{coord}"/>'
+        return self.format_tiles(use_template, points[:2], svg_list)
+
     def svg_face_tile(self, x, y, size, fill_color='red', line_color='black', line_size=1):    
         # Draws the face (F) tile for a cube with its origin at '*' (upper left front corner)
         #   .----.
@@ -254,7 +426,8 @@ class ArrayDraw:
         # |  F |S.
         # |    |/
         # .----.        
-        svg_str = '<rect x="{0}" y="{1}" width="{2}" height="{2}" fill="{3}" stroke="{4}" stroke-width="{5}" stroke-linejoin="round"/>'.format(x, y, size, fill_color, line_color, line_size)
+        p = self.precision
+        svg_str = f'<rect x="{x:.{p}f}" y="{y:.{p}f}" width="{size}" height="{size}" fill="{fill_color}" stroke="{line_color}" stroke-width="{line_size}" stroke-linejoin="round"/>'
         return svg_str
     
     def svg_roof_tile(self, x, y, size, x_proj, y_proj, fill_color='red', line_color='black', line_size=1):              
@@ -273,7 +446,8 @@ class ArrayDraw:
         y3 = y2
         x4 = x3 - x_proj 
         y4 = y3 + y_proj
-        svg_str = '<polygon points="{0}, {1} {2}, {3} {4}, {5} {6}, {7}" fill="{8}" stroke="{9}" stroke-width="{10}" stroke-linejoin="round"/>'.format(x1, y1, x2, y2, x3, y3, x4, y4, fill_color, line_color, line_size)
+        p = self.precision
+        svg_str = f'<polygon points="{x1:.{p}f}, {y1:.{p}f} {x2:.{p}f}, {y2:.{p}f} {x3:.{p}f}, {y3:.{p}f} {x4:.{p}f}, {y4:.{p}f}" fill="{fill_color}" stroke="{line_color}" stroke-width="{line_size}" stroke-linejoin="round"/>'
         return svg_str
 
     def svg_side_tile(self, x, y, size, x_proj, y_proj, fill_color='red', line_color='black', line_size=1):
@@ -292,10 +466,11 @@ class ArrayDraw:
         y3 = y2 + size
         x4 = x3 - x_proj
         y4 = y3 + y_proj
-        svg_str = '<polygon points="{0}, {1} {2}, {3} {4}, {5} {6}, {7}" fill="{8}" stroke="{9}" stroke-width="{10}" stroke-linejoin="round"/>'.format(x1, y1, x2, y2, x3, y3, x4, y4, fill_color, line_color, line_size)
+        p = self.precision
+        svg_str = f'<polygon points="{x1:.{p}f}, {y1:.{p}f} {x2:.{p}f}, {y2:.{p}f} {x3:.{p}f}, {y3:.{p}f} {x4:.{p}f}, {y4:.{p}f}" fill="{fill_color}" stroke="{line_color}" stroke-width="{line_size}" stroke-linejoin="round"/>'
         return svg_str
 
-    def svg_labels(self, x_offset=0, y_offset=0):
+    def svg_labels(self, x_offset=0, y_offset=0, svg_list=None):
         # Add (axis) legends and title text if available
         #      TITLE
         #      .----.
@@ -305,31 +480,43 @@ class ArrayDraw:
         #    |    |/ D
         #    .----.        
         #      W
-        svg_list = []
+        # Labels are appended to svg_list if given, otherwise to a new list
+        if svg_list is None:
+            svg_list = []
+        # Font, anchor and color are the same for all the labels, they are set in a group
+        # dominant-baseline is not inherited in SVG 1.1, so it stays on each <text>
+        group_start = len(svg_list)
+        svg_list.append('<g font-family="Arial, Helvetica, sans-serif" ' +
+                        f'text-anchor="middle" fill="{self.text_color}">')
         # Template for text in SVG, [x, y] is the center of the text
-        template_string = ('<text x="{0}" y="{1}" transform="rotate({2},{0},{1})" ' +
-                           'font-size="{3}" font-family="Arial, Helvetica, sans-serif" ' +
-                           'dominant-baseline="middle" text-anchor="{4}">{5}</text>')
+        # Coordinates are rounded to self.precision decimals
+        template_string = ('<text x="{0:.{4}f}" y="{1:.{4}f}" transform="rotate({2},{0:.{4}f},{1:.{4}f})" ' +
+                           'font-size="{3}" dominant-baseline="middle">{5}</text>')
         # Height label
         if self.legends[0] != None:
             x = x_offset - self.legend_size
-            y = y_offset + (self.shape[2] * self.y_proj * self.cube_size) + (self.shape[0] * self.cube_size) / 2
-            svg_list.append(template_string.format(x, y, -90, self.legend_size, 'middle', self.legends[0]))        
+            y = y_offset + self.depth_y_off + (self.shape[0] * self.cube_size) / 2
+            svg_list.append(template_string.format(x, y, -90, self.legend_size, self.precision, self.legends[0]))        
         # Width label
         if self.legends[1] != None:
             x = x_offset + (self.shape[1] * self.cube_size) / 2
-            y = y_offset + (self.cube_size * ((self.shape[2] * self.y_proj) + self.shape[0])) + self.legend_size
-            svg_list.append(template_string.format(x, y, 0, self.legend_size, 'middle', self.legends[1]))                    
+            y = y_offset + self.depth_y_off + (self.shape[0] * self.cube_size) + self.legend_size
+            svg_list.append(template_string.format(x, y, 0, self.legend_size, self.precision, self.legends[1]))                    
         # Depth label
         if self.legends[2] != None:
-            x = x_offset + (self.shape[1] * self.cube_size) + ((self.shape[2] * self.x_proj * self.cube_size) / 2) + (self.x_proj / self.projection * self.legend_size) 
-            y = y_offset + ((self.shape[2] * self.y_proj * self.cube_size) / 2) + (self.shape[0] * self.cube_size) + (self.y_proj / self.projection * self.legend_size) 
-            svg_list.append(template_string.format(x, y, -self.theta, self.legend_size, 'middle', self.legends[2]))        
+            x = x_offset + (self.shape[1] * self.cube_size) + (self.depth_x_off / 2) + (self.x_proj / self.projection * self.legend_size) 
+            y = y_offset + (self.depth_y_off / 2) + (self.shape[0] * self.cube_size) + (self.y_proj / self.projection * self.legend_size) 
+            svg_list.append(template_string.format(x, y, -self.theta, self.legend_size, self.precision, self.legends[2]))        
         # Title label
         if self.title != None:
-            x = x_offset + self.cube_size * (self.shape[1] + (self.shape[2] * self.x_proj)) / 2 
+            x = x_offset + ((self.shape[1] * self.cube_size) + self.depth_x_off) / 2 
             y = y_offset - self.title_size
-            svg_list.append(template_string.format(x, y, 0, self.title_size, 'middle', self.title))        
+            svg_list.append(template_string.format(x, y, 0, self.title_size, self.precision, self.title))        
+        # Close the group, or remove it if there are no labels
+        if len(svg_list) > group_start + 1:
+            svg_list.append('</g>')
+        else:
+            del svg_list[group_start]
         return svg_list
     
     def make_png(self):
@@ -342,41 +529,77 @@ class ArrayDraw:
         if type(color_input) is str:
             # Face color
             cube_color.append(color_input)  # face color
-            # Roof color
-            cube_color.append(self.rgba_to_hexstr(self.interpolate_color(self.hexstr_to_rgb(color_input),
-                                                                         self.hexstr_to_rgb('#FFFFFF'),
-                                                                         0.5)))
-            cube_color.append(self.rgba_to_hexstr(self.interpolate_color(self.hexstr_to_rgb(color_input),
-                                                                         self.hexstr_to_rgb('#000000'),
-                                                                         0.5)))
+            # Roof and side colors, brighter (towards white) and darker (towards black)
+            # versions of the face color, both computed in one vectorized call
+            shades = self.rgba_to_hexstr(self.interpolate_color(self.hexstr_to_rgb(color_input),
+                                                                _SHADE_TARGETS,
+                                                                0.5))
+            cube_color.extend(shades.tolist())
         # Color is list with 3 elements, either:
         #    3 #RRGGBB string, or
         #    3 np.ndarrays of the sizes [HxW], [WxD], [HxD] (Face, Roof, Side)
-        if len(color_input) == 3:
+        # These are used as they are, no shades are computed
+        elif len(color_input) == 3:
             cube_color = color_input       
+        else:
+            raise ValueError('Color must be one #RRGGBB string, or a list of 3 colors (Face, Roof, Side)')
         return cube_color              
         
+    def flatten_color(self, color):
+        # Per-tile colors as a flat list of #RRGGBB strings, in row-major order
+        # Numeric arrays ([R, G, B] in the last dimension) are converted all at once
+        # Single colors are returned as they are
+        if not isinstance(color, np.ndarray):
+            return color
+        if color.dtype.kind in 'iuf':
+            color = self.rgba_to_hexstr(color)
+            if type(color) is str:
+                return color
+        return color.ravel(order='C').tolist()
+        
     def hexstr_to_rgb(self, hexstr):
         # #FFFFFF   -> [255, 255, 255] 
-        rgba = np.zeros(3)
-        if len(hexstr) != 7:
-            print('Color must be specified as #RRGGBB')
-            return
-        hexstr = hexstr[1:]
-        for ix in range(len(rgba)):
-            rgba[ix] = int('0x' + hexstr[2*ix : 2*(ix+1)], 16)
-        return rgba
+        # Also accepts an np.ndarray of #RRGGBB strings, the result has an extra last 
+        # dimension of size 3, all the strings are parsed at once
+        # Single color, parsed with one int() call
+        if isinstance(hexstr, str):
+            try:
+                value = int(hexstr[1:], 16)
+            except ValueError:
+                value = -1
+            # int() also accepts signs, underscores and a 0x prefix, which are rejected here
+            if len(hexstr) != 7 or value < 0 or '%06x' % value != hexstr[1:].lower():
+                raise ValueError('Color must be specified as #RRGGBB')
+            return np.array([(value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF], dtype=np.float64)
+        hexstr = np.asarray(hexstr)
+        if hexstr.dtype.kind != 'U' or np.any(np.char.str_len(hexstr) != 7):
+            raise ValueError('Color must be specified as #RRGGBB')
+        # ASCII codes of the 6 hex digits for each string (non-ASCII characters become '?')
+        chars = np.frombuffer(''.join(hexstr.ravel().tolist()).encode('ascii', errors='replace'), dtype=np.uint8)
+        chars = chars.reshape(-1, 7)[:, 1:]
+        if not np.all(np.isin(chars, np.frombuffer(b'0123456789abcdefABCDEF', dtype=np.uint8))):
+            raise ValueError('Color must be specified as #RRGGBB')
+        # ASCII -> value of each hex digit, lower-casing letters first ('0'-'9' are not affected)
+        nibbles = (chars | 0x20).astype(np.int16) - ord('0')
+        nibbles = np.where(nibbles > 9, nibbles - (ord('a') - ord('0') - 10), nibbles)
+        rgba = (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+        return rgba.reshape(hexstr.shape + (3,)).astype(np.float64)
     
     def rgba_to_hexstr(self, rgba):
         # [255, 255, 255]      -> #FFFFFF
-        hexstr = ''
-        if len(rgba) != 3:
-            print('Color must be specified as #RRGGBB')
-            return
-        for ix in range(len(rgba)):
-            hexstr = hexstr +  "{:02x}".format(int(rgba[ix])).upper()
-        hexstr = '#' + hexstr
-        return hexstr
+        # Values must be in [0, 255]
+        # Also accepts an np.ndarray with last dimension of size 3, the result is an  
+        # np.ndarray of #RRGGBB strings, all the colors are formatted at once
+        rgba = np.asarray(rgba)
+        if rgba.ndim == 0 or rgba.shape[-1] != 3:
+            raise ValueError('Color must be specified as [R, G, B]')
+        if not np.all((rgba >= 0) & (rgba <= 255)):
+            raise ValueError('Color values [R, G, B] must be between 0 and 255')
+        # Single color, formatted in one step
+        if rgba.ndim == 1:
+            return '#%02X%02X%02X' % (int(rgba[0]), int(rgba[1]), int(rgba[2]))
+        rgb = rgba.astype(np.uint32)
+        return np.char.mod('#%06X', (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2])
     
     def interpolate_color(self, rgb1, rgb2, step):
         # Linear interpolation between 2 colors, from color1 to color 2